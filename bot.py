@@ -1,17 +1,20 @@
 import os
 import logging
 import asyncio
-import subprocess
 import signal
 import sys
 import psutil
-import json
+import aiofiles
+import uvloop
+import orjson
 import threading
+import sqlite3
 import shutil
-from flask import Flask, request
+from dotenv import dotenv_values
+from aiohttp import web
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
-    ApplicationBuilder, ContextTypes, CommandHandler, 
+    ApplicationBuilder, AIORateLimiter, ContextTypes, CommandHandler, 
     MessageHandler, filters, ConversationHandler, CallbackQueryHandler
 )
 
@@ -26,81 +29,127 @@ if not os.path.exists(UPLOAD_DIR):
 
 USERS_FILE = "allowed_users.json"
 OWNERSHIP_FILE = "ownership.json"
+STATE_DB = "state.db"
+
+# Never worth descending into when looking for a repo's main file
+SKIP_DIRS = {".git", "__pycache__", "node_modules", "venv", ".venv"}
 
 # Global State
 running_processes = {} 
+# target ids between the "already running" check and their entry being stored
+starting_processes = set()
+
+def is_running(tid):
+    # 'alive' is cleared by the proc.wait() task, so no waitpid per check
+    return running_processes.get(tid, {}).get('alive', False)
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# --- FLASK SERVER ---
-app = Flask(__name__)
-
-@app.route('/')
-def home(): return "🤖 Python Host Bot is Alive!", 200
-
-@app.route('/status')
-def script_status():
-    script_name = request.args.get('script')
-    if not script_name: return "Specify script", 400
-    if script_name in running_processes and running_processes[script_name]['process'].poll() is None:
-        return f"✅ {script_name} is running.", 200
-    return f"❌ {script_name} is stopped.", 404
-
-def run_flask():
+# --- WEB SERVER (runs on the bot's event loop) ---
+routes = web.RouteTableDef()
+
+@routes.get('/')
+async def home(request): return web.Response(text="🤖 Python Host Bot is Alive!", status=200)
+
+@routes.get('/status')
+async def script_status(request):
+    script_name = request.query.get('script')
+    if not script_name: return web.Response(text="Specify script", status=400)
+    if is_running(script_name):
+        return web.Response(text=f"✅ {script_name} is running.", status=200)
+    return web.Response(text=f"❌ {script_name} is stopped.", status=404)
+
+async def start_web(application):
+    app = web.Application()
+    app.add_routes(routes)
+    runner = web.AppRunner(app)
+    await runner.setup()
     port = int(os.environ.get("PORT", 8080))
-    app.run(host='0.0.0.0', port=port)
+    await web.TCPSite(runner, '0.0.0.0', port).start()
+    application.bot_data['web_runner'] = runner
 
-# --- DATA MANAGEMENT ---
+async def stop_web(application):
+    await application.bot_data['web_runner'].cleanup()
 
-def get_allowed_users():
-    if not os.path.exists(USERS_FILE): return []
-    try:
-        with open(USERS_FILE, 'r') as f: return json.load(f)
-    except: return []
-
-def save_allowed_user(uid):
-    users = get_allowed_users()
-    if uid not in users:
-        users.append(uid)
-        with open(USERS_FILE, 'w') as f: json.dump(users, f)
-        return True
-    return False
+# --- DATA MANAGEMENT ---
 
-def remove_allowed_user(uid):
-    users = get_allowed_users()
-    if uid in users:
-        users.remove(uid)
-        with open(USERS_FILE, 'w') as f: json.dump(users, f)
-        return True
-    return False
+def _write_json(path, data):
+    # Serialize up front so the file gets a single write() call
+    with open(path, 'wb') as f: f.write(orjson.dumps(data))
 
-def load_ownership():
-    if not os.path.exists(OWNERSHIP_FILE): return {}
+def _load_allowed_users():
     try:
-        with open(OWNERSHIP_FILE, 'r') as f: return json.load(f)
-    except: return {}
-
-def save_ownership(target_id, user_id, type_):
-    data = load_ownership()
-    data[target_id] = {"owner": user_id, "type": type_}
-    with open(OWNERSHIP_FILE, 'w') as f: json.dump(data, f)
-
-def delete_ownership(target_id):
-    data = load_ownership()
-    if target_id in data:
-        del data[target_id]
-        with open(OWNERSHIP_FILE, 'w') as f: json.dump(data, f)
+        with open(USERS_FILE, 'rb') as f: return set(orjson.loads(f.read()))
+    except (FileNotFoundError, ValueError): return set()
+
+# Loaded once at startup; mutators update the set and rewrite the file
+_ALLOWED_USERS: set[int] = _load_allowed_users()
+_USERS_FLUSH_LOCK = asyncio.Lock()
+
+async def _flush_users():
+    # The set is only mutated on the loop, so snapshot it here and write the copy in a thread.
+    # The asyncio.Lock queues flushes in order without ever blocking the loop.
+    async with _USERS_FLUSH_LOCK:
+        await asyncio.to_thread(_write_json, USERS_FILE, list(_ALLOWED_USERS))
+
+async def save_allowed_user(uid):
+    if uid in _ALLOWED_USERS: return False
+    _ALLOWED_USERS.add(uid)
+    await _flush_users()
+    return True
+
+async def remove_allowed_user(uid):
+    if uid not in _ALLOWED_USERS: return False
+    _ALLOWED_USERS.discard(uid)
+    await _flush_users()
+    return True
+
+def _open_state_db():
+    conn = sqlite3.connect(STATE_DB, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS ownership(tid TEXT PRIMARY KEY, owner INTEGER, type TEXT)")
+    # One-time import of the old ownership.json
+    try:
+        with open(OWNERSHIP_FILE, 'rb') as f: legacy = orjson.loads(f.read())
+    except (FileNotFoundError, ValueError): legacy = None
+    if legacy is not None:
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO ownership VALUES (?,?,?)",
+                             [(tid, meta.get("owner"), meta.get("type")) for tid, meta in legacy.items()])
+        os.replace(OWNERSHIP_FILE, OWNERSHIP_FILE + ".migrated")
+    conn.commit()
+    return conn
+
+# Each mutation is a single-row statement instead of a full file rewrite
+_DB = _open_state_db()
+_DB_LOCK = threading.Lock()
+# Loop-side reads use their own read-only connection; under WAL they never wait on a writer
+_DB_READ = sqlite3.connect(f"file:{STATE_DB}?mode=ro", uri=True)
+
+def _db_write(sql, params):
+    with _DB_LOCK, _DB: _DB.execute(sql, params)
+
+async def save_ownership(target_id, user_id, type_):
+    await asyncio.to_thread(_db_write, "INSERT OR REPLACE INTO ownership VALUES (?,?,?)", (target_id, user_id, type_))
+
+async def delete_ownership(target_id):
+    await asyncio.to_thread(_db_write, "DELETE FROM ownership WHERE tid=?", (target_id,))
 
 def get_owner(target_id):
-    data = load_ownership()
-    return data.get(target_id, {}).get("owner")
+    row = _DB_READ.execute("SELECT owner FROM ownership WHERE tid=?", (target_id,)).fetchone()
+    return row[0] if row else None
+
+def list_owned(uid):
+    # The admin sees every app; everyone else only their own
+    return _DB_READ.execute("SELECT tid, owner FROM ownership WHERE owner=? OR ?=?", (uid, uid, ADMIN_ID)).fetchall()
 
 # --- DECORATORS ---
 def restricted(func):
     async def wrapped(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         uid = update.effective_user.id
-        if uid != ADMIN_ID and uid not in get_allowed_users():
+        if uid != ADMIN_ID and uid not in _ALLOWED_USERS:
             await update.message.reply_text("⛔ Access Denied.")
             return
         return await func(update, context, *args, **kwargs)
@@ -152,7 +201,7 @@ def smart_fix_requirements(req_path):
 
 async def install_requirements(req_path, update):
     msg = await update.message.reply_text("⏳ **Installing requirements...**")
-    smart_fix_requirements(req_path)
+    await asyncio.to_thread(smart_fix_requirements, req_path)
     try:
         proc = await asyncio.create_subprocess_exec("pip", "install", "-r", req_path, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
         _, stderr = await proc.communicate()
@@ -194,7 +243,7 @@ async def receive_py(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     path = os.path.join(UPLOAD_DIR, fname)
     await file.download_to_drive(path)
-    save_ownership(fname, uid, "file")
+    await save_ownership(fname, uid, "file")
     
     context.user_data['type'] = 'file'
     context.user_data['target_id'] = fname 
@@ -239,9 +288,10 @@ async def receive_env_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         next_state = WAIT_EXTRAS
 
     try:
-        with open(env_path, "a") as f:
-            if os.path.getsize(env_path) > 0: f.write("\n")
-            f.write(text)
+        async with aiofiles.open(env_path, "a") as f:
+            # Append mode starts at EOF, so tell() doubles as the size check
+            if await f.tell() > 0: await f.write("\n")
+            await f.write(text)
         await update.message.reply_text("✅ **Variables Saved!**", reply_markup=next_markup)
     except Exception as e:
         await update.message.reply_text(f"❌ Error: {e}", reply_markup=next_markup)
@@ -272,6 +322,7 @@ WAIT_URL, WAIT_GIT_EXTRAS, WAIT_GIT_ENV_TEXT, WAIT_SELECT_FILE = range(3, 7)
 
 @restricted
 async def git_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data.pop('py_files', None)
     await update.message.reply_text("🌐 **Send Public Git Repository URL**", reply_markup=ReplyKeyboardMarkup([['🔙 Cancel']], resize_keyboard=True))
     return WAIT_URL
 
@@ -285,10 +336,15 @@ async def receive_git_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     repo_path = os.path.join(UPLOAD_DIR, repo_name)
     
     msg = await update.message.reply_text(f"⏳ Cloning `{repo_name}`...")
-    if os.path.exists(repo_path): shutil.rmtree(repo_path)
+    # A previous clone can be thousands of files; delete it off the event loop
+    await asyncio.to_thread(shutil.rmtree, repo_path, ignore_errors=True)
     
     try:
-        subprocess.check_call(["git", "clone", url, repo_path])
+        proc = await asyncio.create_subprocess_exec("git", "clone", "--depth", "1", "--filter=blob:none", "--single-branch", url, repo_path, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+        _, stderr = await proc.communicate()
+        if proc.returncode != 0:
+            await msg.edit_text(f"❌ Clone Failed:\n```\n{stderr.decode()[-1000:]}\n```", parse_mode="Markdown")
+            return ConversationHandler.END
         await msg.edit_text("✅ **Cloned Successfully!**")
         
         # Auto install reqs
@@ -334,12 +390,14 @@ async def receive_git_extras(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def show_file_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     repo_path = context.user_data['repo_path']
-    py_files = []
-    for root, dirs, files in os.walk(repo_path):
-        for file in files:
-            if file.endswith(".py"):
-                rel_path = os.path.relpath(os.path.join(root, file), repo_path)
-                py_files.append(rel_path)
+    py_files = context.user_data.get('py_files')
+    if py_files is None:
+        py_files = []
+        for root, dirs, files in os.walk(repo_path):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+            py_files.extend(os.path.relpath(os.path.join(root, f), repo_path) for f in files if f.endswith(".py"))
+            if len(py_files) >= 10: break
+        context.user_data['py_files'] = py_files
     
     if not py_files:
         await update.message.reply_text("❌ No .py files found.", reply_markup=main_menu_keyboard())
@@ -362,7 +420,7 @@ async def select_git_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
     
     unique_id = f"{repo_name}|{filename}"
-    save_ownership(unique_id, uid, "repo")
+    await save_ownership(unique_id, uid, "repo")
     
     context.user_data['type'] = 'repo'
     context.user_data['target_id'] = unique_id
@@ -373,10 +431,11 @@ async def select_git_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return await execute_logic(update.callback_query, context)
 
 # --- EXECUTION ---
-async def execute_logic(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def execute_logic(update: Update, context: ContextTypes.DEFAULT_TYPE, target_id=None):
     msg_func = update.message.reply_text if update.message else update.callback_query.message.reply_text
     
-    target_id = context.user_data.get('target_id', context.user_data.get('fallback_id'))
+    # Callers outside a conversation pass the id in; user_data can be changed by a concurrent conversation
+    target_id = target_id or context.user_data.get('target_id')
     
     if "|" in target_id:
         repo, file = target_id.split("|")
@@ -388,60 +447,80 @@ async def execute_logic(update: Update, context: ContextTypes.DEFAULT_TYPE):
         script_path = target_id
         env_path = os.path.join(work_dir, f"{target_id}.env")
 
-    if target_id in running_processes and running_processes[target_id]['process'].poll() is None:
+    if is_running(target_id) or target_id in starting_processes:
         await msg_func(f"⚠️ `{target_id}` is already running!", reply_markup=main_menu_keyboard())
         return ConversationHandler.END
 
     custom_env = os.environ.copy()
-    if os.path.exists(env_path):
-        with open(env_path) as f:
-            for l in f:
-                # Basic parsing for KEY="VALUE" or KEY=VALUE
-                if '=' in l and not l.strip().startswith('#'):
-                    k,v = l.strip().split('=', 1)
-                    v = v.strip().strip('"').strip("'")
-                    custom_env[k.strip()] = v
+    # dotenv handles quoting, comments and '=' inside values; a missing file yields {}.
+    # No interpolation: ${NAME} must not expand from the bot's own environment (e.g. TOKEN)
+    custom_env.update({k: v for k, v in dotenv_values(env_path, interpolate=False).items() if v is not None})
 
+    if target_id in running_processes: running_processes[target_id]['log_fp'].close()
     log_file_path = os.path.join(UPLOAD_DIR, f"{target_id.replace('|','_')}.log")
-    log_file = open(log_file_path, "w")
+    # Kept open for the Logs button; append mode keeps the script writing at EOF
+    # even after we seek this shared handle back to read it
+    log_fp = open(log_file_path, "a+b", buffering=0)
+    log_fp.truncate(0)
     
+    starting_processes.add(target_id)
     try:
-        proc = subprocess.Popen(
-            ["python", "-u", script_path], 
-            env=custom_env, stdout=log_file, stderr=subprocess.STDOUT, 
+        proc = await asyncio.create_subprocess_exec(
+            "python", "-u", script_path,
+            env=custom_env, stdout=log_fp, stderr=asyncio.subprocess.STDOUT,
             cwd=work_dir, preexec_fn=os.setsid
         )
-        running_processes[target_id] = {"process": proc, "log": log_file_path}
+        entry = {"process": proc, "log": log_file_path, "log_fp": log_fp, "alive": True}
+        entry['waiter'] = asyncio.create_task(proc.wait())
+        entry['waiter'].add_done_callback(lambda _: entry.update(alive=False))
+        running_processes[target_id] = entry
+        starting_processes.discard(target_id)
         
         await msg_func(f"🚀 **Started!**\nID: `{target_id}`\nPID: {proc.pid}")
         await asyncio.sleep(3)
-        if proc.poll() is not None:
-            log_file.close()
-            with open(log_file_path) as f: log = f.read()[-2000:]
+        if log_fp.closed or running_processes.get(target_id) is not entry:
+            # Stopped or deleted from the manage menu during the wait; that's not a crash
+            return ConversationHandler.END
+        if not entry['alive']:
+            # Only the tail is shown, so skip reading the rest of the log
+            log_fp.seek(max(0, log_fp.seek(0, os.SEEK_END) - 2000))
+            log = log_fp.read().decode(errors="replace")
             await msg_func(f"❌ **Crashed:**\n`{log}`", parse_mode="Markdown", reply_markup=main_menu_keyboard())
         else:
             url = f"{BASE_URL}/status?script={target_id}"
             await msg_func(f"🟢 **Running!**\n🔗 URL: `{url}`", parse_mode="Markdown", reply_markup=main_menu_keyboard())
 
     except Exception as e:
+        starting_processes.discard(target_id)
+        if running_processes.get(target_id, {}).get('log_fp') is not log_fp: log_fp.close()
         await msg_func(f"❌ Error: {e}", reply_markup=main_menu_keyboard())
         
     return ConversationHandler.END
 
+async def stop_process(proc, timeout=5):
+    # Already reaped: the pid may now belong to another script's process group
+    if proc.returncode is not None: return
+    # Scripts run under setsid, so the pid is also the process group id
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        await asyncio.wait_for(proc.wait(), timeout)
+    except ProcessLookupError: pass
+    except asyncio.TimeoutError:
+        try: os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError: pass
+        await proc.wait()
+
 # --- LIST & MANAGE ---
 @restricted
 async def list_hosted(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
-    ownership = load_ownership()
     keyboard = []
     
-    for tid, meta in ownership.items():
-        owner = meta.get("owner")
-        if uid == ADMIN_ID or uid == owner:
-            status = "🟢" if tid in running_processes and running_processes[tid]['process'].poll() is None else "🔴"
-            label = f"{status} {tid}"
-            if uid == ADMIN_ID and uid != owner: label += f" (User: {owner})"
-            keyboard.append([InlineKeyboardButton(label, callback_data=f"man_{tid}")])
+    for tid, owner in list_owned(uid):
+        status = "🟢" if is_running(tid) else "🔴"
+        label = f"{status} {tid}"
+        if uid == ADMIN_ID and uid != owner: label += f" (User: {owner})"
+        keyboard.append([InlineKeyboardButton(label, callback_data=f"man_{tid}")])
 
     if not keyboard:
         await update.message.reply_text("📂 No hosted files.", reply_markup=main_menu_keyboard())
@@ -460,10 +539,10 @@ async def manage_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         owner = get_owner(target_id)
         if uid != ADMIN_ID and uid != owner: return await query.message.reply_text("⛔ Not yours.")
 
-        is_running = target_id in running_processes and running_processes[target_id]['process'].poll() is None
-        text = f"⚙️ **Manage:** `{target_id}`\nStatus: {'🟢 Running' if is_running else '🔴 Stopped'}"
+        running = is_running(target_id)
+        text = f"⚙️ **Manage:** `{target_id}`\nStatus: {'🟢 Running' if running else '🔴 Stopped'}"
         btns = []
-        if is_running:
+        if running:
             btns.append([InlineKeyboardButton("🛑 Stop", callback_data=f"stop_{target_id}")])
             btns.append([InlineKeyboardButton("🔗 URL", callback_data=f"url_{target_id}")])
         else:
@@ -474,39 +553,47 @@ async def manage_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     elif data.startswith("stop_"):
         pid = data.split("stop_")[1]
-        if pid in running_processes:
-            os.killpg(os.getpgid(running_processes[pid]['process'].pid), signal.SIGTERM)
-            running_processes[pid]['process'].wait()
+        entry = running_processes.get(pid)
+        if entry:
+            # Hold on to this entry: a rerun may replace running_processes[pid] while we wait
+            await stop_process(entry['process'])
+            entry['log_fp'].close()
             await query.edit_message_text(f"🛑 Stopped `{pid}`")
             
     elif data.startswith("rerun_"):
-        context.user_data['fallback_id'] = data.split("rerun_")[1]
+        target_id = data.split("rerun_")[1]
         await query.delete_message()
-        await execute_logic(update, context)
+        await execute_logic(update, context, target_id)
 
     elif data.startswith("del_"):
         pid = data.split("del_")[1]
-        if pid in running_processes:
-            try: os.killpg(os.getpgid(running_processes[pid]['process'].pid), signal.SIGTERM)
-            except: pass
-            del running_processes[pid]
-        delete_ownership(pid)
+        entry = running_processes.pop(pid, None)
+        if entry:
+            await stop_process(entry['process'])
+            entry['log_fp'].close()
+        await delete_ownership(pid)
         
-        if "|" in pid: shutil.rmtree(os.path.join(UPLOAD_DIR, pid.split("|")[0]), ignore_errors=True)
+        if "|" in pid: await asyncio.to_thread(shutil.rmtree, os.path.join(UPLOAD_DIR, pid.split("|")[0]), ignore_errors=True)
         else: 
             try: os.remove(os.path.join(UPLOAD_DIR, pid))
             except: pass
         
         for ext in ['.env', '_req.txt', '.log']:
              extra = os.path.join(UPLOAD_DIR, pid + ext if ext != '_req.txt' else f"{pid}_req.txt")
-             if os.path.exists(extra): os.remove(extra)
+             try: os.remove(extra)
+             except FileNotFoundError: pass
         await query.edit_message_text(f"🗑️ Deleted `{pid}`")
 
     elif data.startswith("log_"):
         pid = data.split("log_")[1]
+        log_fp = running_processes.get(pid, {}).get('log_fp')
+        if log_fp and not log_fp.closed:
+            log_fp.seek(0)
+            return await context.bot.send_document(chat_id=update.effective_chat.id, document=log_fp)
         path = os.path.join(UPLOAD_DIR, f"{pid.replace('|','_')}.log")
-        if os.path.exists(path): await context.bot.send_document(chat_id=update.effective_chat.id, document=open(path, 'rb'))
-        else: await query.message.reply_text("❌ No logs.")
+        try: log = open(path, 'rb')
+        except FileNotFoundError: return await query.message.reply_text("❌ No logs.")
+        with log: await context.bot.send_document(chat_id=update.effective_chat.id, document=log)
 
     elif data.startswith("url_"):
         pid = data.split("url_")[1]
@@ -530,28 +617,39 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @super_admin_only
 async def add_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args: return await update.message.reply_text("Usage: `/add 123`")
-    if save_allowed_user(int(context.args[0])): await update.message.reply_text("✅ Added.")
+    if await save_allowed_user(int(context.args[0])): await update.message.reply_text("✅ Added.")
     else: await update.message.reply_text("⚠️ Exists.")
 
 @super_admin_only
 async def remove_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args: return await update.message.reply_text("Usage: `/remove 123`")
-    if remove_allowed_user(int(context.args[0])): await update.message.reply_text("🗑️ Removed.")
+    if await remove_allowed_user(int(context.args[0])): await update.message.reply_text("🗑️ Removed.")
     else: await update.message.reply_text("⚠️ Not found.")
 
 @restricted
 async def server_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     cpu = psutil.cpu_percent()
     ram = psutil.virtual_memory().percent
-    active = sum(1 for p in running_processes.values() if p['process'].poll() is None)
+    active = sum(1 for p in running_processes.values() if p['alive'])
     await update.message.reply_text(f"📊 **Stats**\nCPU: {cpu}%\nRAM: {ram}%\nActive Apps: {active}", parse_mode="Markdown")
 
+# --- MAIN MENU ROUTER ---
+# Upload/Git buttons stay as ConversationHandler entry points so their states are tracked
+MENU_ROUTES = {
+    "📂 My Hosted Apps": list_hosted,
+    "📊 Server Stats": server_stats,
+    "🆘 Help": help_command,
+}
+
+async def dispatch_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await MENU_ROUTES[update.effective_message.text](update, context)
+
 if __name__ == '__main__':
-    t = threading.Thread(target=run_flask)
-    t.daemon = True
-    t.start()
-    
-    app_bot = ApplicationBuilder().token(TOKEN).build()
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    # Stay under Telegram's ~30 msg/s bot-wide limit instead of eating 429s
+    rate_limiter = AIORateLimiter(overall_max_rate=28, max_retries=3)
+    app_bot = ApplicationBuilder().token(TOKEN).rate_limiter(rate_limiter).post_init(start_web).post_shutdown(stop_web).build()
     
     # Upload Handler
     conv_file = ConversationHandler(
@@ -580,7 +678,8 @@ if __name__ == '__main__':
         states={
             WAIT_URL: [
                 MessageHandler(filters.Regex("^🔙 Cancel$"), cancel),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_git_url)
+                # Non-blocking so other users' updates keep flowing during the clone
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receive_git_url, block=False)
             ],
             WAIT_GIT_EXTRAS: [
                 MessageHandler(filters.Regex("^🔙 Cancel$"), cancel),
@@ -599,10 +698,10 @@ if __name__ == '__main__':
     app_bot.add_handler(CommandHandler('remove', remove_user))
     app_bot.add_handler(conv_file)
     app_bot.add_handler(conv_git)
-    app_bot.add_handler(MessageHandler(filters.Regex("^📂 My Hosted Apps$"), list_hosted))
-    app_bot.add_handler(MessageHandler(filters.Regex("^📊 Server Stats$"), server_stats))
-    app_bot.add_handler(MessageHandler(filters.Regex("^🆘 Help$"), help_command))
-    app_bot.add_handler(CallbackQueryHandler(manage_callback))
+    # filters.Text does a set lookup, so only exact menu labels in new messages reach dispatch_menu
+    app_bot.add_handler(MessageHandler(filters.UpdateType.MESSAGE & filters.Text(frozenset(MENU_ROUTES)), dispatch_menu))
+    # Non-blocking: stopping a script can take up to stop_process's timeout
+    app_bot.add_handler(CallbackQueryHandler(manage_callback, block=False))
     app_bot.add_handler(CommandHandler('start', start))
 
     print("Bot is up and running!")